@@ -26,13 +26,15 @@
 
 from urllib.error import HTTPError, URLError
 import streamlit as st
-import tempfile
-import osfexport
-import shutil
+import osf_cache
+import export_jobs
 from datetime import datetime
-import os
+import queue
+import re
+import time
 
 API_HOST = "https://api.osf.io/v2"
+OSF_ID_PATTERN = re.compile(r"^[a-z0-9]{4,8}$")
 PROJECT_GROUPS = ["All projects where I'm a Contributor", "Single Project"]
 pat = ''
 project_id = ''
@@ -49,9 +51,21 @@ if 'checked_if_public' not in st.session_state:
 # Store result of the is_public check to avoid repeating API calls
 if 'is_public' not in st.session_state:
     st.session_state.is_public = False
+# Store exports running in the background (and finished ones) by job ID
+if 'export_jobs' not in st.session_state:
+    st.session_state.export_jobs = {}
+# Store the inputs and job of the last export to avoid exporting the same projects twice
+if 'last_export' not in st.session_state:
+    st.session_state.last_export = None
 
 #REMOVE THE SETTING OPTIONS
-st.markdown("""
+@st.cache_resource
+def load_css():
+    """
+    Build the CSS that hides the Streamlit menu and decorations once per process.
+    """
+
+    return """
     <style>
         .reportview-container {
             margin-top: -2em;
@@ -61,7 +75,21 @@ st.markdown("""
         footer {visibility: hidden;}
         #stDecoration {display:none;}
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# The project list and public checks are cached for a few minutes, let users drop them to see
+# recent changes on the OSF
+with st.sidebar:
+    if st.button(
+        "🔄 Refresh project data",
+        help="Forget the cached project list and visibility checks, the next export fetches them again."
+    ):
+        st.cache_data.clear()
+        # Export again next time, rather than reusing PDFs built from the cleared data
+        st.session_state.last_export = None
+        st.toast("Cached project list cleared, the next export will fetch it again")
 
 
 def get_error_message(error):
@@ -105,11 +133,18 @@ st.subheader("🔐 OSF Project Type")
 project_group = st.radio("Choose projects to export:", PROJECT_GROUPS)
 
 if project_group == PROJECT_GROUPS[1]:
-    project_url = st.text_input(
-        "📁 Enter OSF Project URL or ID:",
-        placeholder="e.g. 'https://osf.io/abcde/' OR 'abcde'"
-    )
-    project_id = osfexport.extract_project_id(project_url) if project_url else ''
+    # Use a form so the app only reruns once the whole URL is entered, not on every keystroke
+    with st.form("url_form", clear_on_submit=False, border=False):
+        project_url = st.text_input(
+            "📁 Enter OSF Project URL or ID:",
+            placeholder="e.g. 'https://osf.io/abcde/' OR 'abcde'"
+        )
+        st.form_submit_button("Set URL")
+    project_id = osf_cache.extract_project_id(project_url) if project_url else ''
+    # Reject malformed IDs here rather than sending API requests that can only fail
+    if project_id and not OSF_ID_PATTERN.match(project_id):
+        st.error(f"'{project_id}' is not a valid OSF project ID. Please check the URL/project ID is correct.")
+        project_id = ''
     if project_id:
         st.info(f"Exporting Project with ID: {project_id}")
     # Check if ID has changed and require rechecking visibility if it has
@@ -118,25 +153,31 @@ if project_group == PROJECT_GROUPS[1]:
         st.session_state.is_public = False
         st.session_state.current_id = project_id
     
+    # Ask for the token upfront: with a token the public check is not needed as get_nodes works either way
+    st.subheader("🔑 OSF Token")
+    pat = st.text_input(
+        "Enter your OSF API token (optional, leave blank if the project is public):",
+        type="password"
+    )
+
     def check_visibility():
         try:
-            st.session_state.is_public = osfexport.is_public(f'{API_HOST}/nodes/{project_id}/')
+            st.session_state.is_public = osf_cache.is_public(f'{API_HOST}/nodes/{project_id}/')
             st.session_state.checked_if_public = True
         except (HTTPError, URLError) as e:
             msg = get_error_message(e)
             st.error(msg)
     
-    is_id_check_ready = st.button(
-        "Check Project is Public", type="secondary",
-        disabled=False if project_id else True,
-        on_click=check_visibility
-    )
+    if not pat:
+        is_id_check_ready = st.button(
+            "Check Project is Public", type="secondary",
+            disabled=False if project_id else True,
+            on_click=check_visibility
+        )
 
-if project_group == PROJECT_GROUPS[1] and st.session_state.checked_if_public:
+if project_group == PROJECT_GROUPS[1] and st.session_state.checked_if_public and not pat:
     if not st.session_state.is_public:
         st.info("To export a private project, you will need to provide a Personal Access Token (PAT).")
-        st.subheader("🔑 OSF Token")
-        pat = st.text_input("Enter your OSF API token:", type="password")
     else:
         st.success("The project is public, no token is required.")
 
@@ -148,10 +189,10 @@ if project_group == PROJECT_GROUPS[0]:
 # Valid states for exporting:
 # Export multiple AND PAT given
 # Export single AND public
-# Export single AND not public and PAT given
+# Export single AND PAT given (public or not)
 valid_export_all = project_group == PROJECT_GROUPS[0] and pat
 valid_export_public = project_group == PROJECT_GROUPS[1] and st.session_state.is_public
-valid_export_private = project_group == PROJECT_GROUPS[1] and pat
+valid_export_private = project_group == PROJECT_GROUPS[1] and project_id and pat
 valid_export_state = valid_export_all or valid_export_public or valid_export_private
 submitted = st.button(
     "Export to PDF", type="primary",
@@ -160,7 +201,7 @@ submitted = st.button(
 
 def download_export_files(pat='', project_id=''):
     """
-    Try to download export files and handle any errors that occur.
+    Fetch the projects to export and start generating their PDFs in the background.
 
     Parameters
     ----------------------
@@ -174,55 +215,132 @@ def download_export_files(pat='', project_id=''):
         None
     """
     
-    with st.spinner("Generating PDF... Please wait."):
+    # Reuse the last export if the inputs have not changed, unless it failed or its project list
+    # would have been fetched again by now
+    export_key = (project_id, osf_cache.hash_token(pat))
+    last_export = st.session_state.last_export
+    if (last_export and last_export['key'] == export_key
+            and time.monotonic() - last_export['started'] < osf_cache.NODES_TTL):
+        job = st.session_state.export_jobs.get(last_export['job_id'])
+        if job and (job['running'] or job['result']):
+            return
+
+    # Capture the export time once, when the user submits
+    st.session_state.export_ts = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    with st.spinner("Fetching projects... Please wait."):
         try:
-            projects, root_nodes = osfexport.get_nodes(
+            projects, root_nodes = osf_cache.get_nodes(
                 pat=pat,
                 project_id=project_id
             )
             if not root_nodes:
                 st.error("No projects found.")
+                return
         except (HTTPError, URLError) as e:
             msg = get_error_message(e)
             st.error(msg)
             return
 
-        # Step 2: Generate the PDFs to a temp folder
-        with tempfile.TemporaryDirectory(delete=True) as tmpdir:
-            pdf_count = 0  # Track number of files for better user messages
-            paths = []
-            for root_idx in root_nodes:
-                pdf_obj, pdf_path = osfexport.write_pdf(
-                    projects,
-                    root_idx=root_idx,
-                    folder=tmpdir
-                )
-                pdf_count += 1
-                paths.append(pdf_path)
-                
-            
-            # Step 3: Create zip file/PDF and display download link
-            if pdf_count > 1:
-                timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-                zip_filename = f'osf_projects_exported_{timestamp}'
-                archive = shutil.make_archive(zip_filename, 'zip', root_dir=tmpdir)
-                st.info(f"📦 {pdf_count} PDF{'s' if pdf_count > 1 else ''} generated and compressed")
-                with open(archive, "rb") as file:
-                    st.download_button(
-                        label=f"📄 Download {'all PDFs' if pdf_count > 1 else 'PDF'} as ZIP",
-                        data=file,
-                        file_name=f"{zip_filename}.zip",
-                        mime="application/zip"
-                    )
+    # Step 2: Generate the PDFs in a background thread, results are picked up on later reruns
+    # Only keep the previous exports that are still running
+    st.session_state.export_jobs = {
+        job_id: job for job_id, job in st.session_state.export_jobs.items() if job['running']
+    }
+    job_id, progress = export_jobs.start_export(projects, root_nodes, st.session_state.export_ts)
+    st.session_state.export_jobs[job_id] = {
+        'progress': progress,
+        'running': True,
+        'pct': 0.0,
+        'warnings': [],
+        'error': None,
+        'result': None
+    }
+    st.session_state.last_export = {'key': export_key, 'job_id': job_id, 'started': time.monotonic()}
+
+
+def update_export_jobs():
+    """
+    Drain the progress queues of the running exports into their session state entries.
+
+    Returns
+    ----------------------
+        True if any export is still running.
+    """
+
+    for job in st.session_state.export_jobs.values():
+        while job['running']:
+            try:
+                update = job['progress'].get_nowait()
+            except queue.Empty:
+                break
+            if 'pct' in update:
+                job['pct'] = update['pct']
+            elif 'failed' in update:
+                error = update['error']
+                if isinstance(error, (HTTPError, URLError)):
+                    message = get_error_message(error)
+                else:
+                    message = f"An error occurred: {error!r}"
+                job['warnings'].append(f"Skipped {update['failed']}. {message}")
+            elif 'error' in update:
+                job['error'] = update['error']
+                job['running'] = False
+            elif 'done' in update:
+                job['result'] = update['done']
+                job['running'] = False
+    return any(job['running'] for job in st.session_state.export_jobs.values())
+
+
+@st.fragment(run_every=0.5)
+def show_running_exports():
+    """
+    Show a progress bar per running export, polling until all of them have finished.
+    """
+
+    if not update_export_jobs():
+        # Rerun the whole app to show the download buttons and stop polling
+        st.rerun()
+    for job in st.session_state.export_jobs.values():
+        if job['running']:
+            st.progress(job['pct'], text="Generating PDFs... Please wait.")
+
+
+def show_finished_exports():
+    """
+    Show the messages and download button of each finished export.
+    """
+
+    for job_id, job in st.session_state.export_jobs.items():
+        if job['running']:
+            continue
+        for warning in job['warnings']:
+            st.warning(warning)
+        error = job['error']
+        if error:
+            if isinstance(error, (HTTPError, URLError)):
+                st.error(get_error_message(error))
             else:
-                with open(paths[0], "rb") as f:
-                    st.download_button(
-                        label=f"📄 Download PDF for {projects[0]['metadata']['title']}",
-                        data=f,
-                        file_name=os.path.basename(paths[0]),
-                        mime="application/pdf"
-                    )
+                st.error(f"Exporting failed as an error occurred: {error}")
+            continue
+        result = job['result']
+        if not result:
+            st.error("No PDFs could be generated.")
+            continue
+        if result['mime'] == "application/zip":
+            st.info(f"📦 {result['count']} PDFs generated and packed into a ZIP")
+        # Downloading doesn't need a rerun, the data is already in session state
+        st.download_button(
+            label=result['label'],
+            data=result['data'],
+            file_name=result['file_name'],
+            mime=result['mime'],
+            key=f"download_{job_id}",
+            on_click="ignore"
+        )
         st.success("✅ PDFs Generated!")
 
 if submitted:
-    download_export_files(pat=pat, project_id=project_id)
\ No newline at end of file
+    download_export_files(pat=pat, project_id=project_id)
+if update_export_jobs():
+    show_running_exports()
+show_finished_exports()
@@ -0,0 +1,154 @@
+'''
+## =================================================================================================
+## Title: Background PDF export jobs for the Streamlit App                                        ##
+## Project:                                                                                       ##
+##      Export OSF Project to PDF - Centre for Open Science (CoS) & University of Manchester (UoM)##
+## UoM Team:                                                                                      ##
+##      Ramiro Bravo, Sarah Jaffa, Benito Matischen                                               ##
+## Description:                                                                                   ##
+##      Generates the PDFs for an export in a daemon thread so the Streamlit script does not      ##
+##      block while the OSF API is queried and the PDFs are written. The worker reports back      ##
+##      through a queue that the app polls:                                                       ##
+##          {"stage": "pdf", "pct": float}      another project has been processed                ##
+##          {"failed": title, "error": error}   a project was skipped                             ##
+##          {"done": result}                    export finished, result is None if nothing built  ##
+##          {"error": error}                    export failed as a whole                          ##
+##      The worker never calls Streamlit itself, it has no script run context.                    ##
+##                                                                                                ##
+## =================================================================================================
+'''
+
+from urllib.error import HTTPError
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import copyreg
+from functools import partial
+import io
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import uuid
+import zipfile
+
+import osfexport
+
+# HTTPError can't be unpickled by default, register how to rebuild it when it comes back from a worker
+copyreg.pickle(HTTPError, lambda e: (HTTPError, (e.url, e.code, e.msg, None, None)))
+
+
+def start_export(projects, root_nodes, timestamp):
+    """
+    Start generating the PDFs for an export in a background thread.
+
+    Parameters
+    -----------------
+        projects: list
+            Projects as returned by osfexport.get_nodes.
+        root_nodes: list
+            Indexes of the projects to write a PDF for.
+        timestamp: str
+            Time of the export, used to name the ZIP file.
+
+    Returns
+    -----------------
+        Tuple of (job_id, progress) where progress is the queue the worker reports to.
+    """
+
+    job_id = uuid.uuid4().hex
+    progress = queue.Queue()
+    threading.Thread(
+        target=_worker,
+        args=(progress, projects, root_nodes, timestamp),
+        daemon=True
+    ).start()
+    return job_id, progress
+
+
+# Projects of the export, sent once to each worker process by _init_worker
+_projects = None
+
+
+def _init_worker(projects):
+    global _projects
+    _projects = projects
+
+
+def _render(projects, root_idx, folder):
+    # May run in a worker process, so only return the path: the PDF object may not be picklable
+    pdf_obj, pdf_path = osfexport.write_pdf(projects, root_idx=root_idx, folder=folder)
+    return pdf_path
+
+
+def _render_one(root_idx, folder):
+    # Task for the process pool, only the index is sent with each task
+    return _render(_projects, root_idx, folder)
+
+
+def _worker(progress, projects, root_nodes, timestamp):
+    try:
+        progress.put({"done": _export(progress, projects, root_nodes, timestamp)})
+    except Exception as e:
+        # Always report back, otherwise the app would keep polling this job forever
+        progress.put({"error": e})
+
+
+def _export(progress, projects, root_nodes, timestamp):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pdfs = []  # (root_idx, path) of each PDF written
+        completed = 0
+        # PDFs are already compressed internally, deflating them again gains almost nothing
+        archive = io.BytesIO()
+        if len(root_nodes) == 1:
+            # A single PDF isn't worth spawning a process (and importing osfexport in it) for
+            executor = ThreadPoolExecutor(max_workers=1)
+            submit = partial(executor.submit, _render, projects)
+        else:
+            # Use processes so rendering is not limited by the GIL, spawn them as forking the
+            # threaded Streamlit server is unsafe. The projects are pickled once per worker
+            # rather than once per task.
+            executor = ProcessPoolExecutor(
+                max_workers=min(len(root_nodes), os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(projects,)
+            )
+            submit = partial(executor.submit, _render_one)
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf, executor:
+            futures = {submit(root_idx, tmpdir): root_idx for root_idx in root_nodes}
+            for future in as_completed(futures):
+                completed += 1
+                # One failed project should not stop the rest of the export
+                try:
+                    path = future.result()
+                    pdfs.append((futures[future], path))
+                    # Archive each PDF as soon as it is ready, while the others are still rendering
+                    if len(root_nodes) > 1:
+                        zf.write(path, arcname=os.path.basename(path))
+                except Exception as e:
+                    progress.put({"failed": projects[futures[future]]['metadata']['title'], "error": e})
+                progress.put({"stage": "pdf", "pct": completed / len(root_nodes)})
+
+        if not pdfs:
+            return None
+
+        if len(pdfs) > 1:
+            return {
+                "count": len(pdfs),
+                "label": "📄 Download all PDFs as ZIP",
+                "data": archive.getvalue(),
+                "file_name": f"osf_projects_exported_{timestamp}.zip",
+                "mime": "application/zip"
+            }
+
+        # Read the single PDF into memory before the temp folder is removed
+        root_idx, path = pdfs[0]
+        with open(path, "rb") as f:
+            data = f.read()
+        return {
+            "count": 1,
+            "label": f"📄 Download PDF for {projects[root_idx]['metadata']['title']}",
+            "data": data,
+            "file_name": os.path.basename(path),
+            "mime": "application/pdf"
+        }
@@ -0,0 +1,104 @@
+'''
+## =================================================================================================
+## Title: Cached OSF API calls for the Streamlit App                                              ##
+## Project:                                                                                       ##
+##      Export OSF Project to PDF - Centre for Open Science (CoS) & University of Manchester (UoM)##
+## UoM Team:                                                                                      ##
+##      Ramiro Bravo, Sarah Jaffa, Benito Matischen                                               ##
+## Description:                                                                                   ##
+##      Streamlit reruns the whole script on every widget interaction. These wrappers keep the    ##
+##      results of the osfexport API calls for a few minutes so reruns with the same inputs do    ##
+##      not hit the OSF API again.                                                                ##
+##                                                                                                ##
+## =================================================================================================
+'''
+
+from functools import lru_cache
+import hashlib
+
+import osfexport
+import streamlit as st
+
+# Seconds the project list from get_nodes is kept for
+NODES_TTL = 300
+
+
+def hash_token(pat):
+    """
+    Digest of a personal access token, safe to use as a cache key.
+
+    Parameters
+    -----------------
+        pat: str
+            Personal Access Token, may be empty for public projects.
+
+    Returns
+    -----------------
+        Hex SHA-256 digest of the token, or an empty string if no token was given.
+    """
+
+    return hashlib.sha256(pat.encode()).hexdigest() if pat else ''
+
+
+@st.cache_data(ttl=NODES_TTL, show_spinner=False)
+def _cached_get_nodes(_pat, pat_digest, project_id):
+    # _pat is left out of the cache key so the raw token is never stored there
+    return osfexport.get_nodes(pat=_pat, project_id=project_id)
+
+
+def get_nodes(pat='', project_id=''):
+    """
+    Cached version of osfexport.get_nodes, keyed on a digest of the token.
+
+    Parameters
+    -----------------
+        pat: str
+            Personal Access Token to use for authentication.
+        project_id: str
+            Optional ID of a project to export.
+
+    Returns
+    -----------------
+        Tuple of (projects, root_nodes) as returned by osfexport.get_nodes.
+    """
+
+    return _cached_get_nodes(pat, hash_token(pat), project_id)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def is_public(url):
+    """
+    Cached version of osfexport.is_public.
+
+    Parameters
+    -----------------
+        url: str
+            API URL of the node to check.
+
+    Returns
+    -----------------
+        True if the node can be read without a token.
+    """
+
+    return osfexport.is_public(url)
+
+
+@lru_cache(maxsize=256)
+def extract_project_id(url):
+    """
+    Memoized version of osfexport.extract_project_id.
+
+    A plain lru_cache is used as st.cache_data would cost more in hashing and copying than
+    parsing the URL again.
+
+    Parameters
+    -----------------
+        url: str
+            Project URL or ID entered by the user.
+
+    Returns
+    -----------------
+        The project ID.
+    """
+
+    return osfexport.extract_project_id(url)
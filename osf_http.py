@@ -0,0 +1,107 @@
+'''
+## =================================================================================================
+## Title: Shared HTTP session for OSF API requests                                                ##
+## Project:                                                                                       ##
+##      Export OSF Project to PDF - Centre for Open Science (CoS) & University of Manchester (UoM)##
+## UoM Team:                                                                                      ##
+##      Ramiro Bravo, Sarah Jaffa, Benito Matischen                                               ##
+## Description:                                                                                   ##
+##      One requests.Session per token for the whole process, so keep-alive connections to        ##
+##      api.osf.io are reused between requests instead of opening a new TCP/TLS connection for    ##
+##      each call. The token is set on the session itself, no per-request headers are needed.     ##
+##      Rate limiting and transient gateway errors are retried with a short backoff.              ##
+##      Anonymous responses are also kept in a SQLite cache on disk, following OSF's              ##
+##      Cache-Control/ETag headers or for an hour otherwise, so repeated exports of public        ##
+##      projects survive server restarts. Token sessions are never cached, to keep private        ##
+##      project data off the disk.                                                                ##
+##                                                                                                ##
+## =================================================================================================
+'''
+
+from functools import lru_cache
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+import requests_cache
+from urllib3.util.retry import Retry
+
+# Also retry when rate limited, waiting as long as OSF's Retry-After header asks
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[429, 502, 503, 504],
+    respect_retry_after_header=True,
+    # Return the last response once retries run out, so raise_for_status() raises an HTTPError
+    # with its status code instead of requests raising a RetryError
+    raise_on_status=False
+)
+# (connect, read) seconds, so a stalled connection can't hang an export
+TIMEOUT = (3.05, 30)
+# Next to this module, not in whatever directory the process happens to run from
+CACHE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "osf_http_cache")
+CACHE_EXPIRE_SECONDS = 3600
+
+
+@lru_cache(maxsize=32)
+def session_for(token=None):
+    """
+    Pooled session that authenticates with the given token.
+
+    Parameters
+    -----------------
+        token: str
+            OSF Personal Access Token, or None for anonymous requests.
+
+    Returns
+    -----------------
+        The same requests.Session for every call with the same token. The anonymous session,
+        and its cache file, are only created the first time they are needed.
+    """
+
+    if token:
+        session = requests.Session()
+        session.headers["Authorization"] = f"Bearer {token}"
+    else:
+        # Serve the last cached copy if OSF can't be reached after the cache expired
+        session = requests_cache.CachedSession(
+            CACHE_NAME,
+            backend="sqlite",
+            expire_after=CACHE_EXPIRE_SECONDS,
+            # Follow OSF's Cache-Control and ETag headers, expired entries are revalidated with a
+            # conditional request so unchanged listings come back as a bodiless 304
+            cache_control=True,
+            allowable_methods=["GET"],
+            stale_if_error=True
+        )
+    session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=RETRY))
+    return session
+
+
+def clear_cache():
+    """
+    Remove all OSF responses cached on disk.
+
+    Returns
+    -----------------
+        True if a cache file existed and was cleared.
+    """
+
+    # Nothing has been cached if the anonymous session was never used in any process
+    if not os.path.exists(f"{CACHE_NAME}.sqlite"):
+        return False
+    session_for().cache.clear()
+    return True
+
+
+if __name__ == "__main__":
+    # Maintenance hook: `python osf_http.py --clear-cache` drops the cached OSF responses, e.g.
+    # when a PDF must reflect edits made on the OSF within the last hour
+    import sys
+    if sys.argv[1:] == ["--clear-cache"]:
+        if clear_cache():
+            print(f"Cleared {CACHE_NAME}.sqlite")
+        else:
+            print("Nothing to clear, no OSF responses have been cached yet")
+    else:
+        print("Usage: python osf_http.py --clear-cache")
@@ -24,116 +24,259 @@
 
 import os
 import io
-import requests
-#import qrcode
+import re
+import threading
+import time
+from osf_http import TIMEOUT, session_for
+import orjson
+import qrcode
+from qrcode.image.pure import PyPNGImage
 #import dotenv
-from PIL import Image
 from reportlab.lib.pagesizes import LETTER
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Table, TableStyle, PageBreak,
+    BaseDocTemplate, Frame, PageTemplate, Paragraph, Table, LongTable, TableStyle, PageBreak,
     Image as RLImage, Spacer
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
+from functools import partial, lru_cache, wraps
+from xml.sax.saxutils import escape
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 #from google.colab import drive
 from datetime import datetime
 from pytz import timezone # Import timezone from pytz
 
 
-# Mount Google Drive and load environment variables
+# Mount Google Drive
 #drive.mount('/content/drive')
-import dotenv
-dotenv.load_dotenv(dotenv_path=".env")
-
-OSF_TOKEN = os.getenv("OSF_TOKEN", "")
 
 BASE_URL = "https://api.osf.io/v2/nodes/"
-
-#HEADERS = {"Authorization": f"Bearer {OSF_TOKEN}"} if OSF_TOKEN else {}
-#HEADERS = {"Authorization": f"Bearer {OSF_TOKEN}"} if OSF_TOKEN else {}
-HEADERS = None
+FETCH_WORKERS = 16  # Concurrent OSF API requests while building a PDF
+PAGE_SIZE = 100  # Items per page of an OSF listing, the API default is 10
+FILE_TABLE_ROWS = 500  # Maximum rows in one file table
+# Caps OSF requests in flight across every pool (folder walks, wikis, components, build_many),
+# more would only queue on the session's 32 pooled connections or get rate limited
+REQUEST_SLOTS = threading.BoundedSemaphore(FETCH_WORKERS)
+CACHE_TTL = 300  # Seconds a fetch is reused for after it was made, so OSF edits show up
 
 timestamp = datetime.now(timezone("UTC")).astimezone().strftime('%Y-%m-%d %H:%M:%S %Z')
 project_qrcode = None
 
-def get_headers(project_type):
-    if project_type == "Private":
-        _headers= HEADERS = {"Authorization": f"Bearer {OSF_TOKEN}"}
-    else:
-        _headers = HEADERS = {"Authorization": {}}
-    return _headers
-
-
-def fetch_project_metadata(project_id):
-    r = requests.get(f"{BASE_URL}{project_id}/?embed=affiliated_institutions", headers=HEADERS)
-    r.raise_for_status()
-    return r.json()["data"]
-
-def fetch_contributors(project_id):
-    r = requests.get(f"{BASE_URL}{project_id}/contributors/?embed=users", headers=HEADERS)
-    r.raise_for_status()
-    return r.json()["data"]
-
-def fetch_components(project_id):
-    r = requests.get(f"{BASE_URL}{project_id}/children/", headers=HEADERS)
+def build_styles():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='MyHeading1', parent=styles['Heading1'], fontSize=18, spaceAfter=10))
+    styles.add(ParagraphStyle(name='MyHeading2', parent=styles['Heading2'], fontSize=14, spaceAfter=6, spaceBefore=12))
+    styles.add(ParagraphStyle(name='MyHeading3', parent=styles['Heading3'], fontSize=12, spaceAfter=4, spaceBefore=10))
+    styles.add(ParagraphStyle(name='MyHeading4', parent=styles['Heading4'], fontSize=8, spaceAfter=4, spaceBefore=10))
+    styles.add(ParagraphStyle(name='MyHeading5', parent=styles['Heading5'], fontSize=7, spaceAfter=4, spaceBefore=10))
+    # Wiki text blocks keep the blank line that separated them in the wiki
+    styles.add(ParagraphStyle(name='WikiText', parent=styles['Normal'], spaceAfter=12))
+    return styles
+
+# Styles are the same for every PDF, build them once
+STYLES = build_styles()
+CONTRIB_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+])
+FILE_TABLE_STYLE = TableStyle([
+    # Header styling
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),  # Header font size
+
+    # Data row styling
+    ('FONTSIZE', (0, 1), (-1, -1), 8),  # Data font size
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+
+    # Grid for all
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+])
+
+def ttl_cache(maxsize):
+    # Like lru_cache, but a result is only reused for CACHE_TTL seconds after it was fetched.
+    # Expired results are dropped as new ones are stored, so they don't keep large listings
+    # alive. Exceptions are not cached.
+    def decorator(func):
+        entries = OrderedDict()  # key -> (fetched_at, result), least recently used first
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            with lock:
+                entry = entries.get(key)
+                if entry and time.monotonic() - entry[0] < CACHE_TTL:
+                    entries.move_to_end(key)
+                    return entry[1]
+            fetched_at = time.monotonic()
+            result = func(*args, **kwargs)
+            with lock:
+                entries[key] = (fetched_at, result)
+                entries.move_to_end(key)
+                now = time.monotonic()
+                for expired in [k for k, (t, _) in entries.items() if now - t >= CACHE_TTL]:
+                    del entries[expired]
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+@lru_cache(maxsize=1)
+def load_env_token():
+    # Only import dotenv and parse the .env file the first time a token is needed
+    import dotenv
+    dotenv.load_dotenv(dotenv_path=".env")
+    return os.getenv("OSF_TOKEN", "")
+
+def get_json(url, session=None, params=None):
+    # orjson parses the raw bytes faster than r.json(), this matters for large file listings
+    if session is None:
+        session = session_for()
+    with REQUEST_SLOTS:
+        r = session.get(url, params=params, timeout=TIMEOUT)
     r.raise_for_status()
-    return r.json()["data"]
-
-
-def fetch_files(component_id, storage_provider="osfstorage"):
+    return orjson.loads(r.content)
+
+def fetch_all_pages(url, session=None):
+    # Follow links.next so long listings are not cut off after the first page
+    items = []
+    params = {"page[size]": PAGE_SIZE}
+    while url:
+        listing = get_json(url, session, params)
+        items.extend(listing["data"])
+        url = (listing.get("links") or {}).get("next")
+        params = None  # next links already carry the page size
+    return items
+
+def embedded_list(embeds, name):
+    # Embedded lists only include their first page (or an error), None means fetch it separately
+    embedded = embeds.get(name, {})
+    if "data" not in embedded or (embedded.get("links") or {}).get("next"):
+        return None
+    return embedded["data"]
+
+@ttl_cache(maxsize=512)
+def fetch_project_bundle(project_id, session=None):
+    # Metadata, components and wiki pages in one request. Contributors are not embedded here as
+    # their users can't be embedded in turn.
+    metadata = get_json(
+        f"{BASE_URL}{project_id}/?embed=affiliated_institutions&embed=children&embed=wikis", session
+    )["data"]
+    embeds = metadata.get("embeds", {})
+    components = embedded_list(embeds, "children")
+    return {
+        "metadata": metadata,
+        "components": components if components is not None else fetch_components(project_id, session),
+        "wiki_pages": embedded_list(embeds, "wikis")
+    }
+
+@ttl_cache(maxsize=512)
+def fetch_contributors(project_id, session=None):
+    return fetch_all_pages(f"{BASE_URL}{project_id}/contributors/?embed=users", session)
+
+@ttl_cache(maxsize=512)
+def fetch_components(project_id, session=None):
+    return fetch_all_pages(f"{BASE_URL}{project_id}/children/", session)
+
+
+@ttl_cache(maxsize=512)
+def fetch_files(component_id, session=None, storage_provider="osfstorage"):
     files_api = f"{BASE_URL}{component_id}/files/{storage_provider}/"
     all_files = []
 
-    def traverse_files(api_url, path_prefix=""):
-        response = requests.get(api_url, headers=HEADERS)
-        response.raise_for_status()
-        entries = response.json().get("data", [])
-
-        for entry in entries:
-            kind = entry["attributes"]["kind"]
-            name = entry["attributes"]["name"]
-            #path_prefix = ""
-            full_path = f"{path_prefix}/{name}" if path_prefix else name
-
-            if kind == "file":
-                size_bytes = entry["attributes"]["size"] or 0
-                #size_gb = size_bytes / (1024 ** 3)  # Convert bytes to GB
-                size_mb = size_bytes / (1024 ** 2)  # Convert bytes to MB
-                all_files.append({
-                    "name": f"/{full_path}",  # force root-style path
-                    "size": round(size_mb, 2),
-                    "link": entry["links"]["download"]
-                })
-            elif kind == "folder":
-                next_url = entry["relationships"]["files"]["links"]["related"]["href"]
-                traverse_files(next_url, full_path)
-
-    traverse_files(files_api)
-    return all_files
-
-
-def fetch_wiki_pages(project_id):
-    r = requests.get(f"{BASE_URL}{project_id}/wikis/", headers=HEADERS)
+    def list_folder(item):
+        api_url, path_prefix, folder_key, page = item
+        # Only set the page size on the first page, next links already include it
+        return get_json(api_url, session, {"page[size]": PAGE_SIZE} if page == 0 else None)
+
+    # Walk the folder tree breadth first so all folders at the same depth (and further pages of a
+    # listing) are fetched concurrently. Each item is (api_url, path_prefix, folder_key, page) and
+    # each entry gets the key folder_key + (page, index), sorting by it gives depth-first order.
+    frontier = [(files_api, "", (), 0)]
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        while frontier:
+            next_frontier = []
+            listings = pool.map(list_folder, frontier)
+            for (api_url, path_prefix, folder_key, page), listing in zip(frontier, listings):
+                for index, entry in enumerate(listing.get("data", [])):
+                    kind = entry["attributes"]["kind"]
+                    name = entry["attributes"]["name"]
+                    full_path = f"{path_prefix}/{name}" if path_prefix else name
+                    entry_key = folder_key + (page, index)
+
+                    if kind == "file":
+                        size_bytes = entry["attributes"]["size"]
+                        all_files.append((entry_key, {
+                            "name": f"/{full_path}",  # force root-style path
+                            # Size in MB, formatted once as it is only shown as text
+                            "size": f"{size_bytes / 1048576:.2f}" if size_bytes else None,
+                            "link": entry["links"]["download"]
+                        }))
+                    elif kind == "folder":
+                        next_url = entry["relationships"]["files"]["links"]["related"]["href"]
+                        next_frontier.append((next_url, full_path, entry_key, 0))
+
+                # Follow pagination, folders with many entries are split over several pages
+                next_page = (listing.get("links") or {}).get("next")
+                if next_page:
+                    next_frontier.append((next_page, path_prefix, folder_key, page + 1))
+            frontier = next_frontier
+
+    # A tuple, as the cached result is shared between callers
+    return tuple(file for entry_key, file in sorted(all_files, key=lambda item: item[0]))
+
+
+@ttl_cache(maxsize=512)
+def fetch_wiki_pages(project_id, session=None):
+    return fetch_all_pages(f"{BASE_URL}{project_id}/wikis/", session)
+
+@ttl_cache(maxsize=512)
+def fetch_wiki_content(page_id, session=None):
+    if session is None:
+        session = session_for()
+    with REQUEST_SLOTS:
+        r = session.get(f"https://api.osf.io/v2/wikis/{page_id}/content/", timeout=TIMEOUT)
     r.raise_for_status()
-    return r.json()["data"]
+    # Wiki contents are UTF-8, setting it skips guessing the charset from the whole body
+    r.encoding = "utf-8"
+    #return r.json()["data"]["attributes"]["content"]
+    return r.text
 
-def fetch_wiki_content_by_id(page_id):
+def fetch_wiki_content_by_id(page_id, session=None):
+    # Failures are not cached, so the page is fetched again next time
     try:
-        r = requests.get(f"https://api.osf.io/v2/wikis/{page_id}/content/", headers=HEADERS)
-        r.raise_for_status()
-        #return r.json()["data"]["attributes"]["content"]
-        return r.text
+        return fetch_wiki_content(page_id, session)
     except Exception:
         return None
 
-def generate_qr_code(url):
-    import qrcode
-    qr = qrcode.make(url)
+@lru_cache(maxsize=256)
+def generate_qr_png(url):
+    # Low error correction and a thinner border keep the matrix and the PNG small, the code is
+    # only ever shown on a page so it doesn't need to survive damage
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=6, border=2)
+    qr.add_data(url)
+    qr.make(fit=True)
+    # pypng writes the PNG directly, PIL is only needed later by ReportLab to read it
+    qr = qr.make_image(image_factory=PyPNGImage)
     img_byte_arr = io.BytesIO()
-    qr.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-    return img_byte_arr
+    qr.save(img_byte_arr)
+    return img_byte_arr.getvalue()
+
+def generate_qr_code(url):
+    # Cache the PNG bytes rather than the BytesIO, which can't be shared between builds
+    return io.BytesIO(generate_qr_png(url))
 
 def render_metadata_section(metadata, story, styles, timestamp):
     story.append(Paragraph("1. Project Metadata", styles["MyHeading2"]))
@@ -150,12 +293,15 @@ def render_metadata_section(metadata, story, styles, timestamp):
         ("DOI", metadata["attributes"].get("doi", "N/A")),
         ("Exported At", timestamp)
     ]
-    for label, value in meta_fields:
-        story.append(Paragraph(f"<b>{label}:</b> {value}", styles["Normal"]))
 
     institutions = metadata.get("embeds", {}).get("affiliated_institutions", {}).get("data", [])
     names = ", ".join([i["attributes"]["name"] for i in institutions]) if institutions else "None listed"
-    story.append(Paragraph(f"<b>Affiliated Institution(s):</b> {names}", styles["Normal"]))
+    meta_fields.append(("Affiliated Institution(s)", names))
+
+    # One Paragraph for all fields is much less layout work than one per field. Values are
+    # escaped as a stray "<" or "&" in a description would break the Paragraph markup.
+    html = "<br/>".join(f"<b>{label}:</b> {escape(str(value))}" for label, value in meta_fields)
+    story.append(Paragraph(html, styles["Normal"]))
     story.append(Spacer(1, 12))
 
 def render_contributors_section(contributors, story, styles):
@@ -172,11 +318,7 @@ def render_contributors_section(contributors, story, styles):
         data.append([name, biblio, email])
 
     table = Table(data, colWidths=[2.5*inch, 1*inch, 2.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-    ]))
+    table.setStyle(CONTRIB_TABLE_STYLE)
     story.append(table)
     story.append(Spacer(1, 12))
 
@@ -184,71 +326,69 @@ def render_file_table(files, story, styles, heading=None):
     if heading:
         story.append(Paragraph(heading, styles["MyHeading2"]))
     if not files:
-        story.append(Paragraph("3. No files available.", styles["Normal"]))
+        story.append(Paragraph("No files available.", styles["Normal"]))
         return
-    story.append(Paragraph("3. Files OSF Storage", styles["MyHeading2"]))
-    if not files:
-        story.append(Paragraph("3. No files available.", styles["Normal"]))
-        return
-    table_data = [["File Name", "Size \n(MB)", "Download Link"]]
-    for f in files:
-        table_data.append([f["name"], f["size"] if f["size"] else "N/A", f["link"]])
-    table = Table(table_data, colWidths=[4*inch, 0.5*inch, 2.8*inch])
-    '''
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    '''
-    table.setStyle(TableStyle([
-        # Header styling
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),  # Header font size
-
-        # Data row styling
-        ('FONTSIZE', (0, 1), (-1, -1), 8),  # Data font size
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-
-        # Grid for all
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-    story.append(table)
+    rows = [[f["name"], f["size"] if f["size"] else "N/A", f["link"]] for f in files]
+    # Split long listings into several tables, splitting one huge Table over pages gets
+    # quadratically slower with its number of rows
+    for start in range(0, len(rows), FILE_TABLE_ROWS):
+        table_data = [["File Name", "Size \n(MB)", "Download Link"]] + rows[start:start + FILE_TABLE_ROWS]
+        render_file_table_chunk(table_data, story)
     story.append(Spacer(1, 12))
 
-def render_wiki_section(project_id, story, styles):
-    story.append(Paragraph("4. Wiki", styles["MyHeading2"]))
+def render_file_table_chunk(table_data, story):
+    # Cells are single-line strings, so every row height is known up front: a two-line 12pt
+    # header and 8pt data rows. Passing them saves measuring every cell of the table.
+    # LongTable lays out long tables faster, and repeating the header keeps every page readable
+    table = LongTable(
+        table_data,
+        colWidths=[4*inch, 0.5*inch, 2.8*inch],
+        rowHeights=[30] + [18] * (len(table_data) - 1),
+        repeatRows=1
+    )
+    table.setStyle(FILE_TABLE_STYLE)
+    story.append(table)
+
+def fetch_wiki(project_id, wiki_pages=None, session=None):
+    # Returns {"pages": [(page, content), ...], "error": message or None}, content is None for
+    # pages that couldn't be fetched
     try:
-        wiki_pages = fetch_wiki_pages(project_id)
-        if not wiki_pages:
-            story.append(Paragraph("No wiki pages found.", styles["Normal"]))
-            return
-        for page in wiki_pages:
-            title = page["attributes"].get("name", "Untitled")
-            page_id = page["id"]
-            #added for debug
-            story.append(Paragraph(page_id.replace('\n','<br/>'), styles["Normal"]))
-            #end added
-            content = fetch_wiki_content_by_id(page_id)
-            story.append(Paragraph(title, styles["MyHeading3"]))
-            if content:
-                story.append(Paragraph(content.replace('\n', '<br/>'), styles["Normal"]))
-            else:
-                story.append(Paragraph("No content returned or unauthorized access", styles["Normal"]))
-            story.append(Spacer(1, 12))
+        if wiki_pages is None:
+            wiki_pages = fetch_wiki_pages(project_id, session)
+        # Fetch the content of every page concurrently, then keep them in order
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            contents = list(pool.map(
+                partial(fetch_wiki_content_by_id, session=session), [page["id"] for page in wiki_pages]
+            ))
+        return {"pages": list(zip(wiki_pages, contents)), "error": None}
     except Exception as e:
-        story.append(Paragraph("Error", styles["MyHeading3"]))
-        story.append(Paragraph(f"Could not fetch wiki: {e}", styles["Normal"]))
+        return {"pages": [], "error": str(e)}
 
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from functools import partial
-from datetime import datetime
-import os
+def render_wiki_section(wiki, story, styles):
+    story.append(Paragraph("4. Wiki", styles["MyHeading2"]))
+    if wiki["error"]:
+        story.append(Paragraph("Error", styles["MyHeading3"]))
+        story.append(Paragraph(f"Could not fetch wiki: {escape(wiki['error'])}", styles["Normal"]))
+        return
+    if not wiki["pages"]:
+        story.append(Paragraph("No wiki pages found.", styles["Normal"]))
+        return
+    for page, content in wiki["pages"]:
+        title = page["attributes"].get("name", "Untitled")
+        page_id = page["id"]
+        #added for debug
+        story.append(Paragraph(page_id.replace('\n','<br/>'), styles["Normal"]))
+        #end added
+        story.append(Paragraph(title, styles["MyHeading3"]))
+        if content:
+            # One Paragraph per block of text so long pages can be split between blocks
+            # without parsing the whole page again. Escape it, wiki text is not markup.
+            for block in re.split(r"\r?\n\s*\r?\n", content):
+                if block.strip():
+                    story.append(Paragraph(escape(block).replace('\n', '<br/>'), styles["WikiText"]))
+        else:
+            story.append(Paragraph("No content returned or unauthorized access", styles["Normal"]))
+        story.append(Spacer(1, 12))
 
 def add_page_number(canvas, doc, timestamp, project_qrcode):
     canvas.saveState()
@@ -258,43 +398,63 @@ def add_page_number(canvas, doc, timestamp, project_qrcode):
     canvas.drawString(0.75 * inch, 0.75 * inch, f"Exported: {timestamp}")
     canvas.drawString(7.25 * inch, 0.75 * inch, f"Page: {page_number_text}")
 
-    # Draw QR Code on each page
+    # Draw QR Code on each page. It is drawn into a form on the first page, later pages only
+    # reference the form instead of drawing the image again.
     if project_qrcode:
-        canvas.drawImage(project_qrcode, 4.00 * inch, 0.75 * inch, width=0.5 * inch, height=0.5 * inch)
+        if not canvas.hasForm("project_qrcode"):
+            canvas.beginForm("project_qrcode", 0, 0, 0.5 * inch, 0.5 * inch)
+            canvas.drawImage(project_qrcode, 0, 0, width=0.5 * inch, height=0.5 * inch)
+            canvas.endForm()
+        canvas.translate(4.00 * inch, 0.75 * inch)
+        canvas.doForm("project_qrcode")
 
     canvas.restoreState()
 
-def build_pdf(project_id, isTest=False, output_path=None, api_token=None, project_type=None):
+def get_session(api_token=None, project_type=None):
     token = api_token
-    HEADERS = get_headers(project_type)
-
     if project_type == "Private":
-        token = api_token
         if not token:
-            from dotenv import load_dotenv
-            load_dotenv()
-            token = os.getenv("OSF_TOKEN")
+            token = load_env_token()
         if not token:
             raise ValueError("No OSF token provided.")
-
-    metadata = fetch_project_metadata(project_id)
-    contributors = fetch_contributors(project_id)
-    components = fetch_components(project_id)
+    # Every request for this PDF goes through the session for this token
+    return session_for(token or None)
+
+def fetch_project_data(project_id, session=None):
+    # Everything the PDF shows, fetched up front so rendering needs no network (and the result
+    # can be sent to another process)
+    # Fetch from the OSF API concurrently, in two waves as component files need the component IDs
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        bundle_future = pool.submit(fetch_project_bundle, project_id, session)
+        contributors_future = pool.submit(fetch_contributors, project_id, session)
+        files_future = pool.submit(fetch_files, project_id, session)
+
+        bundle = bundle_future.result()
+        components = bundle["components"]
+        wiki_future = pool.submit(fetch_wiki, project_id, bundle["wiki_pages"], session)
+        component_files_futures = [pool.submit(fetch_files, comp["id"], session) for comp in components]
+        return {
+            "project_id": project_id,
+            "metadata": bundle["metadata"],
+            "contributors": contributors_future.result(),
+            "files": files_future.result(),
+            "wiki": wiki_future.result(),
+            "components": components,
+            "component_files": [future.result() for future in component_files_futures]
+        }
+
+def render_pdf(data, output_path=None, isTest=False):
+    project_id = data["project_id"]
+    metadata = data["metadata"]
 
     project_url = f"https://{'test' if isTest else 'osf'}.io/{project_id}/"
     #timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     timestamp = datetime.now(timezone("UTC")).astimezone().strftime('%Y-%m-%d %H:%M:%S %Z')
 
-    doc = SimpleDocTemplate(output_path, pagesize=LETTER)
+    # Render in memory when no output path is given so nothing is left on disk
+    output = output_path if output_path else io.BytesIO()
 
-    # Styles
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='MyHeading1', parent=styles['Heading1'], fontSize=18, spaceAfter=10))
-    styles.add(ParagraphStyle(name='MyHeading2', parent=styles['Heading2'], fontSize=14, spaceAfter=6, spaceBefore=12))
-    styles.add(ParagraphStyle(name='MyHeading3', parent=styles['Heading3'], fontSize=12, spaceAfter=4, spaceBefore=10))
-    styles.add(ParagraphStyle(name='MyHeading4', parent=styles['Heading4'], fontSize=8, spaceAfter=4, spaceBefore=10))
-    styles.add(ParagraphStyle(name='MyHeading5', parent=styles['Heading5'], fontSize=7, spaceAfter=4, spaceBefore=10))
-    
+    styles = STYLES
     story = []
 
     # Title and Project URL
@@ -315,24 +475,49 @@ def build_pdf(project_id, isTest=False, output_path=None, api_token=None, projec
 
     # Metadata Sections
     render_metadata_section(metadata, story, styles, timestamp)
-    render_contributors_section(contributors, story, styles)
+    render_contributors_section(data["contributors"], story, styles)
     story.append(PageBreak())
-    render_file_table(fetch_files(project_id), story, styles, "Files in Main Project")
-    render_wiki_section(project_id, story, styles)
+    render_file_table(data["files"], story, styles, "3. Files OSF Storage")
+    render_wiki_section(data["wiki"], story, styles)
 
     # Components
     story.append(Paragraph("5. Components and Their Files", styles["MyHeading2"]))
-    for comp in components:
+    for comp, comp_files in zip(data["components"], data["component_files"]):
         title = comp["attributes"]["title"]
-        comp_id = comp["id"]
         comp_url = comp["links"]["html"]
 
         story.append(Paragraph(title, styles["MyHeading3"]))
         story.append(Paragraph(f"Component URL: <a href='{comp_url}'>{comp_url}</a>", styles["Normal"]))
-        render_file_table(fetch_files(comp_id), story, styles)
+        render_file_table(comp_files, story, styles)
 
     # Add Page Number and QR on all pages
     add_page_func = partial(add_page_number, timestamp=timestamp, project_qrcode=project_qrcode)
-    doc.build(story, onFirstPage=add_page_func, onLaterPages=add_page_func)
+    # A single page template with one frame, the same 1 inch margins SimpleDocTemplate used
+    frame = Frame(inch, inch, LETTER[0] - 2 * inch, LETTER[1] - 2 * inch, id="body")
+    doc = BaseDocTemplate(
+        output,
+        pagesize=LETTER,
+        pageTemplates=[PageTemplate(id="main", frames=[frame], onPage=add_page_func)]
+    )
+    doc.build(story)
+
+    return output_path if output_path else output.getvalue()
 
-    return output_path
\ No newline at end of file
+def build_pdf(project_id, isTest=False, output_path=None, api_token=None, project_type=None):
+    session = get_session(api_token, project_type)
+    return render_pdf(fetch_project_data(project_id, session), output_path, isTest)
+
+def build_many(project_ids, isTest=False, api_token=None, project_type=None):
+    # PDFs for several projects, in the same order as project_ids. Fetching is network bound and
+    # runs in threads, rendering is CPU bound and runs in separate processes to avoid the GIL.
+    session = get_session(api_token, project_type)
+    with ThreadPoolExecutor(max_workers=min(len(project_ids), 4) or 1) as fetch_pool, ProcessPoolExecutor(
+        max_workers=min(len(project_ids), os.cpu_count() or 1) or 1,
+        # Forking a process that runs threads (like the Streamlit server) is unsafe
+        mp_context=multiprocessing.get_context("spawn")
+    ) as render_pool:
+        render_futures = [
+            render_pool.submit(render_pdf, data, None, isTest)
+            for data in fetch_pool.map(partial(fetch_project_data, session=session), project_ids)
+        ]
+        return [future.result() for future in render_futures]